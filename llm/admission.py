@@ -0,0 +1,155 @@
+# llm/admission.py
+# Admission control for the ML service: per-endpoint in-flight caps,
+# client deadlines and fast load shedding
+
+import math
+import threading
+import time
+from typing import Callable, Optional
+import anyio
+import anyio.to_thread
+from fastapi import HTTPException, Request
+
+DEADLINE_HEADER = "X-Deadline-Ms"
+
+
+class DeadlineExceeded(Exception):
+    """Raised by work that notices the client has stopped waiting."""
+
+
+class Deadline:
+    """Absolute monotonic deadline derived from the client's time budget."""
+
+    def __init__(self, timeout: float):
+        self.expires_at = time.monotonic() + timeout
+
+    @classmethod
+    def from_request(cls, request: Request, default_timeout: float) -> "Deadline":
+        """
+        Read the client's remaining budget (milliseconds) from X-Deadline-Ms,
+        never allowing more than the endpoint's default timeout.
+        """
+        header = request.headers.get(DEADLINE_HEADER)
+        if not header:
+            return cls(default_timeout)
+        try:
+            budget_ms = float(header)
+        except ValueError:
+            budget_ms = math.nan
+        if not math.isfinite(budget_ms) or budget_ms <= 0:
+            raise HTTPException(status_code=400, detail=f"Invalid {DEADLINE_HEADER} header: {header}")
+        return cls(min(budget_ms / 1000, default_timeout))
+
+    def remaining(self) -> float:
+        return self.expires_at - time.monotonic()
+
+    def check(self, stage: str):
+        if self.remaining() <= 0:
+            raise DeadlineExceeded(f"Deadline exceeded before {stage}")
+
+    def timeout(self, cap: float) -> float:
+        """Timeout for a blocking call: the smaller of cap and the time left."""
+        return max(0.001, min(cap, self.remaining()))
+
+
+class AdmissionGate:
+    """
+    Caps in-flight work for one endpoint and runs it on a dedicated
+    thread limiter, so slow endpoints cannot starve the others.
+
+    Requests beyond the cap are rejected immediately with 503 and a
+    Retry-After hint; requests that outlive their deadline get 504.
+    """
+
+    def __init__(self, name: str, max_in_flight: int, default_timeout: float):
+        self.name = name
+        self.max_in_flight = max_in_flight
+        self.default_timeout = default_timeout
+        self.in_flight = 0
+        self.shed = 0
+        self.expired = 0
+        self.avg_latency = 0.0  # EWMA of completed work, seconds
+        self._lock = threading.Lock()
+        self._limiter = None
+
+    def _get_limiter(self) -> anyio.CapacityLimiter:
+        # CapacityLimiter needs a running event loop, so create it on first use
+        if self._limiter is None:
+            self._limiter = anyio.CapacityLimiter(self.max_in_flight)
+        return self._limiter
+
+    def deadline(self, request: Request) -> Deadline:
+        return Deadline.from_request(request, self.default_timeout)
+
+    def retry_after(self) -> int:
+        return max(1, math.ceil(self.avg_latency))
+
+    def _admit(self, deadline: Deadline):
+        with self._lock:
+            if deadline.remaining() <= 0:
+                self.expired += 1
+                raise HTTPException(status_code=504, detail=f"{self.name}: deadline already passed")
+            if self.in_flight >= self.max_in_flight:
+                self.shed += 1
+                raise HTTPException(
+                    status_code=503,
+                    detail=f"{self.name}: overloaded, retry later",
+                    headers={"Retry-After": str(self.retry_after())},
+                )
+            self.in_flight += 1
+
+    def _release(self, elapsed: Optional[float] = None):
+        with self._lock:
+            self.in_flight -= 1
+            if elapsed is not None:
+                self.avg_latency = elapsed if self.avg_latency == 0 else 0.8 * self.avg_latency + 0.2 * elapsed
+
+    async def run(self, deadline: Deadline, func: Callable, *args):
+        """
+        Run blocking work in a worker thread under this gate.
+
+        If the deadline passes, the response returns 504 right away; the
+        worker keeps its in-flight slot until it actually finishes, so
+        abandoned work still counts against the cap.
+        """
+        self._admit(deadline)
+        state = {"value": "pending"}
+
+        def work():
+            with self._lock:
+                if state["value"] == "abandoned":
+                    return None
+                state["value"] = "running"
+            start = time.monotonic()
+            try:
+                deadline.check(self.name)
+                return func(*args)
+            finally:
+                self._release(time.monotonic() - start)
+
+        try:
+            with anyio.fail_after(max(0.0, deadline.remaining())):
+                return await anyio.to_thread.run_sync(
+                    work, abandon_on_cancel=True, limiter=self._get_limiter()
+                )
+        except (TimeoutError, DeadlineExceeded) as e:
+            with self._lock:
+                self.expired += 1
+            raise HTTPException(status_code=504, detail=f"{self.name}: {str(e) or 'deadline exceeded'}")
+        finally:
+            # Work that never reached a thread must give its slot back here
+            with self._lock:
+                never_started = state["value"] == "pending"
+                if never_started:
+                    state["value"] = "abandoned"
+            if never_started:
+                self._release()
+
+    def stats(self) -> dict:
+        return {
+            "inFlight": self.in_flight,
+            "maxInFlight": self.max_in_flight,
+            "shed": self.shed,
+            "expired": self.expired,
+            "avgLatencyMs": round(self.avg_latency * 1000, 1),
+        }
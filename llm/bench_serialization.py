@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Benchmark the ML service wire formats without a running server.
+
+The baseline mirrors FastAPI's handling of the original /predict endpoint
+(body -> json.loads -> validation of the v1-Config OppInput model ->
+jsonable_encoder -> JSONResponse's json.dumps) and is compared with the
+compiled-validator/orjson path and msgpack, for single requests and
+row/columnar batches.
+"""
+
+import argparse
+import json
+import time
+import warnings
+from typing import List, Optional
+import orjson
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, Field, TypeAdapter
+from service import opp_input_adapter, opp_batch_adapter
+from wire import OrjsonResponse, msgpack
+
+SAMPLE = {
+    "token": "ETH",
+    "chain": "ethereum",
+    "price": 42.5,
+    "gas": 3.2,
+    "grossProfit": 42.5,
+    "netProfit": 39.3,
+    "roi": 3.93,
+    "tradeVolume": 1000.0,
+    "priceDiffPercent": 1.2,
+    "pricePerToken": 4.1,
+}
+RESULT = {
+    "profitable": True,
+    "roi": 3.93,
+    "score": 0.87,
+    "metadata": {"tokenRecognized": True, "chainRecognized": True, "modelUsed": "RandomForestClassifier"},
+}
+
+with warnings.catch_warnings():
+    # pydantic 2 warns about the renamed v1 config key
+    warnings.simplefilter("ignore")
+
+    class LegacyOppInput(BaseModel):
+        """OppInput as it was declared before the wire format change."""
+        token: str
+        chain: str
+        price: float
+        gas: float
+        gross_profit: Optional[float] = Field(default=None, alias='grossProfit')
+        net_profit: Optional[float] = Field(default=None, alias='netProfit')
+        roi: Optional[float] = None
+        trade_volume: Optional[float] = Field(default=None, alias='tradeVolume')
+        price_diff_percent: Optional[float] = Field(default=None, alias='priceDiffPercent')
+        price_per_token: Optional[float] = Field(default=None, alias='pricePerToken')
+
+        class Config:
+            allow_population_by_field_name = True
+
+legacy_input_adapter = TypeAdapter(LegacyOppInput)
+legacy_rows_adapter = TypeAdapter(List[LegacyOppInput])
+
+
+def columnar(rows):
+    return {key: [row[key] for row in rows] for key in rows[0]}
+
+
+def bench(label, fn, iterations):
+    fn()  # warm up
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    elapsed = (time.perf_counter() - start) / iterations
+    print(f"   {label:<28} {elapsed * 1e6:10.1f} µs")
+    return elapsed
+
+
+# --- Request/response paths; each returns the encoded response body ---
+
+def default_single(body: bytes) -> bytes:
+    legacy_input_adapter.validate_python(json.loads(body))
+    return JSONResponse(jsonable_encoder(RESULT)).body
+
+
+def default_rows(body: bytes, results: dict) -> bytes:
+    [dict(row) for row in legacy_rows_adapter.validate_python(json.loads(body))]
+    return JSONResponse(jsonable_encoder(results)).body
+
+
+def fast_single(body: bytes) -> bytes:
+    opp_input_adapter.validate_json(body)
+    return OrjsonResponse(RESULT).body
+
+
+def fast_rows(body: bytes, results: dict) -> bytes:
+    [dict(row) for row in opp_batch_adapter.validate_json(body)]
+    return OrjsonResponse(results).body
+
+
+def fast_columns(body: bytes, results: dict) -> bytes:
+    opp_batch_adapter.validate_json(body).to_rows()
+    return OrjsonResponse(results).body
+
+
+def msgpack_columns(body: bytes, results: dict) -> bytes:
+    opp_batch_adapter.validate_python(msgpack.unpackb(body, raw=False)).to_rows()
+    return msgpack.packb(results, use_bin_type=True)
+
+
+def run(batch_size: int, iterations: int):
+    rows = [dict(SAMPLE) for _ in range(batch_size)]
+    results = {"predictions": [RESULT] * batch_size}
+
+    single_json = json.dumps(SAMPLE).encode()
+    rows_json = json.dumps(rows).encode()
+    cols_json = json.dumps(columnar(rows)).encode()
+
+    print(f"\n📊 Single request ({len(single_json)} bytes JSON)")
+    base = bench("default json", lambda: default_single(single_json), iterations)
+    fast = bench("validate_json + orjson", lambda: fast_single(single_json), iterations)
+    print(f"   speedup: {base / fast:.1f}x")
+
+    print(f"\n📊 Batch of {batch_size} rows ({len(rows_json)} bytes rows, {len(cols_json)} bytes columnar)")
+    base = bench("default json (rows)", lambda: default_rows(rows_json, results), iterations)
+    bench("validate_json + orjson (rows)", lambda: fast_rows(rows_json, results), iterations)
+    fast = bench("validate_json + orjson (cols)", lambda: fast_columns(cols_json, results), iterations)
+    print(f"   speedup (cols vs default): {base / fast:.1f}x")
+
+    if msgpack is None:
+        print("\n⚠️  msgpack not installed, skipping msgpack benchmark")
+        return
+
+    cols_msgpack = msgpack.packb(columnar(rows), use_bin_type=True)
+    print(f"\n📊 msgpack batch ({len(cols_msgpack)} bytes columnar)")
+    packed = bench("unpackb + validate + packb", lambda: msgpack_columns(cols_msgpack, results), iterations)
+    print(f"   speedup (vs default json rows): {base / packed:.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark ML service serialization paths")
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("⏱️  ML Service Serialization Benchmark")
+    print("=" * 60)
+    run(args.batch_size, args.iterations)
@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+Compact the trained Random Forest for cheaper inference.
+
+Greedily selects the smallest subset of trees (or a shallow distilled tree)
+that stays within a quality tolerance of the full forest on held-out data,
+then saves it as an alternative artifact that predict.py can load with
+MODEL_VARIANT=compact.
+"""
+
+import argparse
+import copy
+import json
+import os
+import sys
+import time
+import joblib
+import numpy as np
+import pandas as pd
+from typing import Optional
+from sklearn.base import clone
+from sklearn.metrics import accuracy_score, roc_auc_score
+from sklearn.model_selection import train_test_split
+from sklearn.tree import DecisionTreeClassifier
+from train import load_opportunities_from_mongodb, build_features, split_data
+
+MODEL_PATH = "models/arbitrage_model.pkl"
+FEATURES_PATH = "models/arbitrage_model_features.txt"
+COMPACT_MODEL_PATH = "models/arbitrage_model_compact.pkl"
+REPORT_PATH = "models/arbitrage_model_compact_report.json"
+
+DEFAULT_TOLERANCE = 0.005  # Keep 99.5% of full-forest quality
+DISTILL_DEPTHS = [3, 4, 5, 6]
+LATENCY_REPEATS = 200
+LATENCY_MARGIN = 0.2  # Only switch models for a >20% latency win
+VALIDATION_SIZE = 0.25  # Share of the training split used for selection
+
+
+def score_proba(y_true: np.ndarray, proba: np.ndarray, metric: str) -> float:
+    """Score positive-class probabilities with AUC or accuracy."""
+    if metric == "auc":
+        return float(roc_auc_score(y_true, proba))
+    return float(accuracy_score(y_true, (proba >= 0.5).astype(int)))
+
+
+def subset_forest(model, indices):
+    """Return a copy of the forest that only keeps the given trees."""
+    compact = copy.deepcopy(model)
+    compact.estimators_ = [model.estimators_[i] for i in indices]
+    compact.n_estimators = len(compact.estimators_)
+    return compact
+
+
+def greedy_tree_order(model, X: np.ndarray, y: np.ndarray, metric: str):
+    """
+    Forward-select trees one at a time, always adding the tree that gives
+    the best held-out score for the averaged ensemble.
+
+    Returns:
+        List of (tree_index, score) in selection order
+    """
+    positive = list(model.classes_).index(1)
+    tree_proba = np.stack([t.predict_proba(X)[:, positive] for t in model.estimators_])
+
+    remaining = list(range(len(model.estimators_)))
+    running_sum = np.zeros(X.shape[0])
+    order = []
+
+    while remaining:
+        k = len(order) + 1
+        best_idx, best_score = None, -np.inf
+        for i in remaining:
+            candidate = score_proba(y, (running_sum + tree_proba[i]) / k, metric)
+            if candidate > best_score:
+                best_idx, best_score = i, candidate
+        running_sum += tree_proba[best_idx]
+        remaining.remove(best_idx)
+        order.append((best_idx, best_score))
+
+    return order
+
+
+def measure_latency_ms(model, X_row: pd.DataFrame) -> float:
+    """Median single-row predict_proba latency, matching predict.py usage."""
+    model.predict_proba(X_row)  # warm up
+    timings = []
+    for _ in range(LATENCY_REPEATS):
+        start = time.perf_counter()
+        model.predict_proba(X_row)
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings) * 1000)
+
+
+def _is_better(candidate: dict, chosen: Optional[dict]) -> bool:
+    """
+    Prefer a candidate only if it is clearly faster; latencies within
+    LATENCY_MARGIN of each other are noise, so those ties go to quality.
+    """
+    if chosen is None:
+        return True
+    if candidate["latencyMs"] < chosen["latencyMs"] * (1 - LATENCY_MARGIN):
+        return True
+    if chosen["latencyMs"] < candidate["latencyMs"] * (1 - LATENCY_MARGIN):
+        return False
+    return candidate["validationScore"] > chosen["validationScore"]
+
+
+def compact_model(df: pd.DataFrame, tolerance: float, max_trees: int):
+    """
+    Build the trade-off curve and pick the cheapest model within tolerance.
+
+    The saved forest was trained on the whole training set, so a copy with
+    the same hyperparameters is refit without a validation split, and tree
+    order and distillation come from that copy. A candidate is only
+    accepted if its test score is within tolerance of the saved forest's
+    test score, so the reported quality is the real cost of switching.
+
+    Returns:
+        (compact model or None if nothing meets the tolerance, report)
+    """
+    if not os.path.exists(MODEL_PATH) or not os.path.exists(FEATURES_PATH):
+        print(f"❌ ERROR: Trained model not found at {MODEL_PATH}. Run train.py first.")
+        sys.exit(1)
+
+    trained = joblib.load(MODEL_PATH)
+    with open(FEATURES_PATH, "r") as f:
+        feature_names = [line.strip() for line in f.readlines()]
+
+    X, y, _ = build_features(df)
+    # Align to the columns the saved model was trained on
+    X = X.reindex(columns=feature_names, fill_value=0)
+    X_train, X_test, y_train, y_test = split_data(X, y)
+    X_fit, X_val, y_fit, y_val = train_test_split(
+        X_train, y_train, test_size=VALIDATION_SIZE, random_state=42,
+        stratify=y_train if len(y_train.unique()) > 1 else None
+    )
+
+    y_val = y_val.to_numpy()
+    y_test = y_test.to_numpy()
+    metric = "auc" if len(np.unique(y_val)) > 1 and len(np.unique(y_test)) > 1 else "accuracy"
+    X_row = X_test.iloc[[0]]
+
+    def test_score(candidate) -> float:
+        return score_proba(y_test, candidate.predict_proba(X_test)[:, 1], metric)
+
+    full_score = test_score(trained)
+    target = full_score * (1 - tolerance)
+    full_latency = measure_latency_ms(trained, X_row)
+
+    print(f"\n📊 Full forest: {len(trained.estimators_)} trees, "
+          f"test {metric}={full_score:.4f}, latency={full_latency:.3f} ms")
+    print(f"🎯 Target test {metric} >= {target:.4f} (tolerance {tolerance:.2%})")
+
+    print(f"\n🤖 Refitting forest on {len(X_fit)} rows, holding out {len(X_val)} for validation...")
+    model = clone(trained).fit(X_fit, y_fit)
+
+    def make_point(candidate, validation_score: float, score: float, **info) -> dict:
+        return {
+            **info,
+            "validationScore": validation_score,
+            "score": score,
+            "relativeQuality": score / full_score if full_score else 0.0,
+            "latencyMs": measure_latency_ms(candidate, X_row),
+        }
+
+    # Greedy tree subset selection: order on validation, accept on test
+    print("\n🌲 Greedy tree selection...")
+    order = greedy_tree_order(model, X_val.to_numpy(dtype=np.float32), y_val, metric)
+
+    curve = []
+    chosen = None
+    for k, (_, val_score) in enumerate(order, start=1):
+        checkpoint = k <= 10 or k % 10 == 0 or k == len(order)
+        eligible = chosen is None and k <= max_trees
+        if not checkpoint and not eligible:
+            continue
+        candidate = subset_forest(model, [i for i, _ in order[:k]])
+        score = test_score(candidate)
+        meets = eligible and score >= target
+        if not checkpoint and not meets:
+            continue
+        point = make_point(candidate, val_score, score, kind="forest", trees=k)
+        curve.append(point)
+        if meets:
+            chosen = (candidate, point)
+
+    # Distillation into a single shallow tree trained on forest labels
+    print("🧪 Distilling into shallow trees...")
+    teacher_labels = model.predict(X_fit)
+    for depth in DISTILL_DEPTHS:
+        student = DecisionTreeClassifier(max_depth=depth, random_state=42)
+        student.fit(X_fit, teacher_labels)
+        if len(student.classes_) < 2:
+            continue
+        val_score = score_proba(y_val, student.predict_proba(X_val)[:, 1], metric)
+        point = make_point(student, val_score, test_score(student), kind="distilled", trees=1, depth=depth)
+        curve.append(point)
+        if point["score"] >= target and _is_better(point, chosen[1] if chosen else None):
+            chosen = (student, point)
+
+    print("\n📊 Latency vs quality trade-off (test split, relative to the saved forest):")
+    print(pd.DataFrame(curve).to_string(index=False))
+
+    report = {
+        "metric": metric,
+        "tolerance": tolerance,
+        "full": {
+            "trees": len(trained.estimators_),
+            "score": full_score,
+            "latencyMs": full_latency,
+        },
+        "selected": chosen[1] if chosen else None,
+        "curve": curve,
+    }
+    return (chosen[0] if chosen else None), report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compact the trained arbitrage model")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="Allowed relative quality loss vs the full forest (default 0.005)")
+    parser.add_argument("--max-trees", type=int, default=50,
+                        help="Largest tree subset considered compact (default 50)")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("🗜️  Compacting ML Model")
+    print("=" * 60)
+
+    df = load_opportunities_from_mongodb()
+    compact, report = compact_model(df, args.tolerance, args.max_trees)
+
+    with open(REPORT_PATH, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\n💾 Saved trade-off report to {REPORT_PATH}")
+
+    if compact is None:
+        print(f"\n❌ No compact model keeps {1 - args.tolerance:.2%} of full quality on the test split; "
+              f"{COMPACT_MODEL_PATH} was not written. Keep serving MODEL_VARIANT=full "
+              f"or retry with a larger --tolerance.")
+        sys.exit(1)
+
+    joblib.dump(compact, COMPACT_MODEL_PATH)
+    print(f"💾 Saved compact model to {COMPACT_MODEL_PATH}")
+
+    selected = report["selected"]
+    print(f"\n✅ Selected {selected['kind']} ({selected['trees']} tree(s)): "
+          f"{selected['relativeQuality']:.2%} of full quality, "
+          f"{selected['latencyMs']:.3f} ms vs {report['full']['latencyMs']:.3f} ms")
+    print("   Serve it with: MODEL_VARIANT=compact python3 -m uvicorn service:app --port 8000")
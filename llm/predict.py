@@ -9,11 +9,22 @@ import os
 import joblib
 import pandas as pd
 import numpy as np
-from typing import Optional
+from typing import List, Optional
 from tokens_config import SUPPORTED_CHAINS, SUPPORTED_TOKENS
+from profiling import span
 
 # Load trained model
-MODEL_PATH = "models/arbitrage_model.pkl"
+# MODEL_VARIANT=compact serves the pruned/distilled model built by compact.py
+MODEL_VARIANT = os.getenv("MODEL_VARIANT", "full").lower()
+MODEL_PATHS = {
+    "full": "models/arbitrage_model.pkl",
+    "compact": "models/arbitrage_model_compact.pkl",
+}
+if MODEL_VARIANT not in MODEL_PATHS:
+    raise ValueError(
+        f"Unknown MODEL_VARIANT '{MODEL_VARIANT}'. Expected one of: {', '.join(MODEL_PATHS)}"
+    )
+MODEL_PATH = MODEL_PATHS[MODEL_VARIANT]
 FEATURES_PATH = "models/arbitrage_model_features.txt"
 
 model = None
@@ -25,7 +36,8 @@ def load_model():
     
     if not os.path.exists(MODEL_PATH):
         raise FileNotFoundError(
-            f"Model not found at {MODEL_PATH}. Run train.py first to train the model."
+            f"Model not found at {MODEL_PATH}. Run train.py first to train the model"
+            + (" and compact.py to build the compact variant." if MODEL_VARIANT == "compact" else ".")
         )
     
     if not os.path.exists(FEATURES_PATH):
@@ -37,7 +49,7 @@ def load_model():
     with open(FEATURES_PATH, "r") as f:
         feature_names = [line.strip() for line in f.readlines()]
     
-    print(f"✅ Loaded model with {len(feature_names)} features")
+    print(f"✅ Loaded {MODEL_VARIANT} model ({type(model).__name__}) with {len(feature_names)} features")
 
 
 # Load model on module import
@@ -49,7 +61,7 @@ except FileNotFoundError as e:
     model = None
 
 
-def predict_opportunity(
+def _derive_inputs(
     token: str,
     chain: str,
     price: float,
@@ -61,24 +73,7 @@ def predict_opportunity(
     price_diff_percent: Optional[float] = None,
     price_per_token: Optional[float] = None,
 ):
-    """
-    Predict opportunity profitability using TRAINED MODEL.
-    
-    Args:
-        token: Token symbol (e.g., "ETH")
-        chain: Source chain (e.g., "ethereum")
-        price: Gross profit in USD
-        gas: Gas cost in USD
-        gross_profit: Gross profit (optional, defaults to price)
-        net_profit: Net profit after gas (optional)
-        roi: Return on investment % (optional)
-        trade_volume: Trade volume in USD (optional)
-        price_diff_percent: Price difference % (optional)
-        price_per_token: Price difference per token (optional)
-    
-    Returns:
-        Dictionary with profitable, roi, and score fields
-    """
+    """Normalize one request and fill in the derived model inputs."""
     token = token.upper()
     chain = chain.lower()
     
@@ -94,38 +89,34 @@ def predict_opportunity(
     else:
         roi_value = 0.0
     
-    priceDiff = price_per_token if price_per_token is not None else gross
-    priceDiffPercent = price_diff_percent if price_diff_percent is not None else 0.0
-    
-    # Early exit if clearly unprofitable
-    if net <= 0:
-        return {
-            "profitable": False,
-            "roi": roi_value,
-            "score": 0.0,
-        }
-    
-    # If model not loaded, return basic heuristic score
-    if model is None:
-        # Simple heuristic as fallback
-        score = min(1.0, max(0.0, net / 100.0))
-        return {
-            "profitable": net > 0,
-            "roi": roi_value,
-            "score": score,
-            "warning": "Model not trained yet, using fallback heuristic"
-        }
+    return {
+        "token": token,
+        "chain": chain,
+        "gross": gross,
+        "net": net,
+        "gas": gas,
+        "roi": roi_value,
+        "volume": trade_value,
+        "priceDiff": price_per_token if price_per_token is not None else gross,
+        "priceDiffPercent": price_diff_percent if price_diff_percent is not None else 0.0,
+    }
+
+
+def _feature_row(inputs: dict):
+    """Model feature values for one request, in feature_names order."""
+    token = inputs["token"]
+    chain = inputs["chain"]
     
     # Prepare features for model prediction
     # Must match the training features exactly
     features_dict = {
-        "grossProfit": gross,
-        "netProfit": net,
-        "gasCost": gas,
-        "priceDiff": priceDiff,
-        "priceDiffPercent": priceDiffPercent,
-        "roi": roi_value,
-        "volume": trade_value,
+        "grossProfit": inputs["gross"],
+        "netProfit": inputs["net"],
+        "gasCost": inputs["gas"],
+        "priceDiff": inputs["priceDiff"],
+        "priceDiffPercent": inputs["priceDiffPercent"],
+        "roi": inputs["roi"],
+        "volume": inputs["volume"],
     }
     
     # Add one-hot encoded symbol features
@@ -149,31 +140,122 @@ def predict_opportunity(
     elif "ethereum" in [c for c in SUPPORTED_CHAINS]:
         features_dict["chainTo_ethereum"] = 1
     
-    # Create DataFrame with features in correct order
-    X = pd.DataFrame([[features_dict.get(f, 0) for f in feature_names]], columns=feature_names)
+    return [features_dict.get(f, 0) for f in feature_names]
+
+
+def build_feature_frame(inputs: List[dict]) -> pd.DataFrame:
+    """One DataFrame with a row per request, columns in training order."""
+    return pd.DataFrame([_feature_row(i) for i in inputs], columns=feature_names)
+
+
+def _heuristic(inputs: dict, **extra):
+    # Simple heuristic as fallback
+    net = inputs["net"]
+    return {
+        "profitable": net > 0,
+        "roi": inputs["roi"],
+        "score": min(1.0, max(0.0, net / 100.0)),
+        **extra,
+    }
+
+
+def predict_opportunities(requests: List[dict]):
+    """
+    Score many opportunities with a single model call.
+    
+    Args:
+        requests: Keyword arguments for predict_opportunity, one dict per opportunity
+    
+    Returns:
+        List of result dictionaries in request order
+    """
+    results = [None] * len(requests)
+    to_score = []
+    
+    for i, request in enumerate(requests):
+        inputs = _derive_inputs(**request)
+        
+        # Early exit if clearly unprofitable
+        if inputs["net"] <= 0:
+            results[i] = {"profitable": False, "roi": inputs["roi"], "score": 0.0}
+        # If model not loaded, return basic heuristic score
+        elif model is None:
+            results[i] = _heuristic(inputs, warning="Model not trained yet, using fallback heuristic")
+        else:
+            to_score.append((i, inputs))
+    
+    if not to_score:
+        return results
+    
+    with span("feature_build"):
+        X = build_feature_frame([inputs for _, inputs in to_score])
     
     # Predict
     try:
-        probability = model.predict_proba(X)[0][1]  # Probability of profitable class
-        prediction = model.predict(X)[0]  # 0 or 1
-        
-        return {
-            "profitable": bool(prediction),
-            "roi": roi_value,
-            "score": float(probability),
-            "metadata": {
-                "tokenRecognized": token in SUPPORTED_TOKENS,
-                "chainRecognized": chain in SUPPORTED_CHAINS,
-                "modelUsed": "RandomForest"
-            },
-        }
+        with span("model"):
+            # Probability of profitable class; predict() is just proba > 0.5
+            probabilities = model.predict_proba(X)[:, 1]
     except Exception as e:
         print(f"❌ Model prediction error: {e}")
         # Fallback to simple heuristic
-        score = min(1.0, max(0.0, net / 100.0))
-        return {
-            "profitable": net > 0,
-            "roi": roi_value,
-            "score": score,
-            "error": str(e)
+        for i, inputs in to_score:
+            results[i] = _heuristic(inputs, error=str(e))
+        return results
+    
+    for (i, inputs), probability in zip(to_score, probabilities):
+        results[i] = {
+            "profitable": bool(probability > 0.5),
+            "roi": inputs["roi"],
+            "score": float(probability),
+            "metadata": {
+                "tokenRecognized": inputs["token"] in SUPPORTED_TOKENS,
+                "chainRecognized": inputs["chain"] in SUPPORTED_CHAINS,
+                "modelUsed": type(model).__name__,
+                "modelVariant": MODEL_VARIANT,
+            },
         }
+    return results
+
+
+def predict_opportunity(
+    token: str,
+    chain: str,
+    price: float,
+    gas: float,
+    gross_profit: Optional[float] = None,
+    net_profit: Optional[float] = None,
+    roi: Optional[float] = None,
+    trade_volume: Optional[float] = None,
+    price_diff_percent: Optional[float] = None,
+    price_per_token: Optional[float] = None,
+):
+    """
+    Predict opportunity profitability using TRAINED MODEL.
+    
+    Args:
+        token: Token symbol (e.g., "ETH")
+        chain: Source chain (e.g., "ethereum")
+        price: Gross profit in USD
+        gas: Gas cost in USD
+        gross_profit: Gross profit (optional, defaults to price)
+        net_profit: Net profit after gas (optional)
+        roi: Return on investment % (optional)
+        trade_volume: Trade volume in USD (optional)
+        price_diff_percent: Price difference % (optional)
+        price_per_token: Price difference per token (optional)
+    
+    Returns:
+        Dictionary with profitable, roi, and score fields
+    """
+    return predict_opportunities([{
+        "token": token,
+        "chain": chain,
+        "price": price,
+        "gas": gas,
+        "gross_profit": gross_profit,
+        "net_profit": net_profit,
+        "roi": roi,
+        "trade_volume": trade_volume,
+        "price_diff_percent": price_diff_percent,
+        "price_per_token": price_per_token,
+    }])[0]
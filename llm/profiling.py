@@ -0,0 +1,218 @@
+# llm/profiling.py
+# On-demand sampling profiler and per-request stage tracing for the ML service
+
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextvars import ContextVar
+from typing import List, Optional
+
+TRACE_BUFFER_SIZE = int(os.getenv("TRACE_BUFFER_SIZE", "512"))
+UNTRACED_PREFIXES = ("/admin", "/stream")
+
+_current_trace: ContextVar[Optional["Trace"]] = ContextVar("current_trace", default=None)
+
+
+# --- Sampling profiler ---
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    name = getattr(code, "co_qualname", code.co_name)
+    return f"{os.path.basename(code.co_filename)}:{name}"
+
+
+class SamplingProfiler:
+    """
+    Samples every thread's Python stack at a fixed interval and aggregates
+    them as collapsed stacks ("thread;frame;frame count"), the input format
+    of flamegraph.pl and speedscope. Nothing runs between profiles.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def profile(self, seconds: float, interval: float) -> str:
+        """Block for `seconds`, sampling every `interval`; returns collapsed stacks."""
+        with self._lock:
+            if self._thread is not None:
+                raise RuntimeError("A profile is already running")
+            self._thread = threading.current_thread()
+
+        try:
+            counts = Counter()
+            own_id = threading.get_ident()
+            end = time.monotonic() + seconds
+            while time.monotonic() < end:
+                names = {t.ident: t.name for t in threading.enumerate()}
+                for thread_id, frame in sys._current_frames().items():
+                    if thread_id == own_id:
+                        continue
+                    stack = []
+                    while frame is not None:
+                        stack.append(_frame_name(frame))
+                        frame = frame.f_back
+                    stack.append(names.get(thread_id, str(thread_id)).replace(" ", "_"))
+                    counts[";".join(reversed(stack))] += 1
+                time.sleep(interval)
+        finally:
+            with self._lock:
+                self._thread = None
+
+        return "\n".join(f"{stack} {count}" for stack, count in counts.most_common()) + "\n"
+
+
+profiler = SamplingProfiler()
+
+
+# --- Per-request stage tracing ---
+
+class Trace:
+    """
+    Timing spans for one request, recorded relative to its start. Spans
+    still open when the trace closes (e.g. a blocking call the request
+    stopped waiting for) are kept and marked unfinished.
+    """
+
+    __slots__ = ("method", "path", "started_at", "start", "duration_ms", "status", "spans",
+                 "open_spans", "closed", "lock")
+
+    def __init__(self, method: str, path: str):
+        self.method = method
+        self.path = path
+        self.started_at = time.time()
+        self.start = time.perf_counter()
+        self.duration_ms = 0.0
+        self.status = None
+        self.spans = []
+        self.open_spans = []
+        self.closed = False
+        # Spans end in worker threads that may outlive the request
+        self.lock = threading.Lock()
+
+    def close(self):
+        end = time.perf_counter()
+        with self.lock:
+            self.closed = True
+            self.duration_ms = (end - self.start) * 1000
+            for open_span in self.open_spans:
+                self.spans.append(open_span.record(end, unfinished=True))
+            self.open_spans = []
+
+    def to_dict(self) -> dict:
+        return {
+            "method": self.method,
+            "path": self.path,
+            "startedAt": self.started_at,
+            "durationMs": round(self.duration_ms, 3),
+            "status": self.status,
+            "spans": [
+                {"name": name, "offsetMs": round(offset, 3), "durationMs": round(duration, 3),
+                 "unfinished": unfinished}
+                for name, offset, duration, unfinished in self.spans
+            ],
+        }
+
+
+class _Span:
+    __slots__ = ("trace", "name", "start")
+
+    def __init__(self, trace: Trace, name: str):
+        self.trace = trace
+        self.name = name
+
+    def record(self, end: float, unfinished: bool = False) -> tuple:
+        return (self.name, (self.start - self.trace.start) * 1000, (end - self.start) * 1000, unfinished)
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        with self.trace.lock:
+            if not self.trace.closed:
+                self.trace.open_spans.append(self)
+        return self
+
+    def __exit__(self, *exc):
+        end = time.perf_counter()
+        with self.trace.lock:
+            # After close the span was already stored as unfinished
+            if not self.trace.closed:
+                self.trace.open_spans.remove(self)
+                self.trace.spans.append(self.record(end))
+        return False
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+def span(name: str):
+    """
+    Time a stage of the current request. Returns a shared no-op when the
+    request is not being traced, so call sites cost one ContextVar lookup.
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        return _NOOP_SPAN
+    return _Span(trace, name)
+
+
+class Tracer:
+    """Keeps the most recent request traces in a fixed-size ring buffer."""
+
+    def __init__(self, enabled: bool, size: int):
+        self.enabled = enabled
+        self.traces = deque(maxlen=size)
+
+    def slowest(self, limit: int) -> List[dict]:
+        recent = list(self.traces)
+        recent.sort(key=lambda t: t.duration_ms, reverse=True)
+        return [t.to_dict() for t in recent[:limit]]
+
+
+tracer = Tracer(enabled=os.getenv("TRACE_REQUESTS", "").lower() in ("1", "true"), size=TRACE_BUFFER_SIZE)
+
+
+class TracingMiddleware:
+    """
+    ASGI middleware that opens a Trace per HTTP request while tracing is
+    enabled. Worker threads started with anyio inherit the ContextVar, so
+    spans from blocking code land in the same trace.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not tracer.enabled or scope["path"].startswith(UNTRACED_PREFIXES):
+            await self.app(scope, receive, send)
+            return
+
+        trace = Trace(scope["method"], scope["path"])
+        token = _current_trace.set(trace)
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                trace.status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            _current_trace.reset(token)
+            trace.close()
+            tracer.traces.append(trace)
@@ -1,22 +1,55 @@
 # llm/service.py
 
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel, Field
-from typing import Optional
-from predict import predict_opportunity
+from fastapi import APIRouter, Depends, FastAPI, Header, HTTPException, Query, Request
+from fastapi.responses import PlainTextResponse
+from pydantic import BaseModel, ConfigDict, Field, TypeAdapter, model_validator
+from typing import List, Optional, Union
+from predict import predict_opportunities, predict_opportunity
+from wire import OrjsonResponse, decode_body, encode_response, request_body_openapi
+from admission import AdmissionGate, Deadline, DeadlineExceeded
+from profiling import TracingMiddleware, profiler, span, tracer
+from streaming import OpportunityStream, Subscriber, SubscriptionResponse
+from tokens_config import SUPPORTED_CHAINS, SUPPORTED_TOKENS
+import anyio.to_thread
+import hmac
 import requests
 import os
 from dotenv import load_dotenv
+import pymongo
 from pymongo import MongoClient
 
 load_dotenv()
 
-app = FastAPI()
+app = FastAPI(default_response_class=OrjsonResponse)
+app.add_middleware(TracingMiddleware)
+
+# Admission control: each endpoint gets its own in-flight cap and worker
+# thread limiter, so slow arbitrage lookups cannot starve /predict or /health
+predict_gate = AdmissionGate(
+    "predict",
+    max_in_flight=int(os.getenv("PREDICT_MAX_IN_FLIGHT", "16")),
+    default_timeout=float(os.getenv("PREDICT_TIMEOUT_S", "10")),
+)
+batch_gate = AdmissionGate(
+    "predict_batch",
+    max_in_flight=int(os.getenv("PREDICT_BATCH_MAX_IN_FLIGHT", "4")),
+    default_timeout=float(os.getenv("PREDICT_TIMEOUT_S", "10")),
+)
+arbitrage_gate = AdmissionGate(
+    "arbitrage_opportunity",
+    max_in_flight=int(os.getenv("ARBITRAGE_MAX_IN_FLIGHT", "8")),
+    default_timeout=float(os.getenv("ARBITRAGE_TIMEOUT_S", "15")),
+)
 
 
 @app.get("/health")
-def health_check():
-    return {"status": "ok"}
+async def health_check():
+    # async so it never waits behind busy worker threads
+    return {
+        "status": "ok",
+        "admission": {gate.name: gate.stats() for gate in (predict_gate, batch_gate, arbitrage_gate)},
+        "stream": opportunity_stream.stats(),
+    }
 
 # MongoDB connection for fetching chain-specific DEX prices
 MONGODB_URI = os.getenv("MONGODB_URI", "mongodb://localhost:27017/arbitrader")
@@ -29,6 +62,8 @@ def get_mongo_client():
     return mongo_client
 
 class OppInput(BaseModel):
+    model_config = ConfigDict(populate_by_name=True)
+
     token: str
     chain: str
     price: float
@@ -40,24 +75,75 @@ class OppInput(BaseModel):
     price_diff_percent: Optional[float] = Field(default=None, alias='priceDiffPercent')
     price_per_token: Optional[float] = Field(default=None, alias='pricePerToken')
 
-    class Config:
-        allow_population_by_field_name = True
-
-@app.post("/predict")
-def get_prediction(data: OppInput):
-    result = predict_opportunity(
-        token=data.token,
-        chain=data.chain,
-        price=data.price,
-        gas=data.gas,
-        gross_profit=data.gross_profit,
-        net_profit=data.net_profit,
-        roi=data.roi,
-        trade_volume=data.trade_volume,
-        price_diff_percent=data.price_diff_percent,
-        price_per_token=data.price_per_token
-    )
-    return result
+class OppColumns(BaseModel):
+    """Columnar batch: one list per OppInput field, all the same length."""
+    model_config = ConfigDict(populate_by_name=True)
+
+    token: List[str]
+    chain: List[str]
+    price: List[float]
+    gas: List[float]
+    gross_profit: Optional[List[Optional[float]]] = Field(default=None, alias='grossProfit')
+    net_profit: Optional[List[Optional[float]]] = Field(default=None, alias='netProfit')
+    roi: Optional[List[Optional[float]]] = None
+    trade_volume: Optional[List[Optional[float]]] = Field(default=None, alias='tradeVolume')
+    price_diff_percent: Optional[List[Optional[float]]] = Field(default=None, alias='priceDiffPercent')
+    price_per_token: Optional[List[Optional[float]]] = Field(default=None, alias='pricePerToken')
+
+    @model_validator(mode='after')
+    def check_lengths(self):
+        size = len(self.token)
+        for name in OppInput.model_fields:
+            column = getattr(self, name)
+            if column is not None and len(column) != size:
+                raise ValueError(f"Column '{name}' has {len(column)} values, expected {size}")
+        return self
+
+    def to_rows(self) -> List[dict]:
+        columns = {
+            name: getattr(self, name)
+            for name in OppInput.model_fields
+            if getattr(self, name) is not None
+        }
+        return [dict(zip(columns, values)) for values in zip(*columns.values())]
+
+# Compiled once at import; validate_json parses and validates in a single pass
+opp_input_adapter = TypeAdapter(OppInput)
+opp_batch_adapter = TypeAdapter(Union[List[OppInput], OppColumns])
+
+def run_prediction(fields: dict):
+    # OppInput field names match predict_opportunity's keyword arguments
+    return predict_opportunity(**fields)
+
+def run_batch_prediction(rows: List[dict], deadline: Deadline):
+    # One feature frame and one predict_proba call for the whole batch
+    deadline.check("batch scoring")
+    return predict_opportunities(rows)
+
+@app.post("/predict", openapi_extra=request_body_openapi(OppInput.model_json_schema()))
+async def get_prediction(request: Request):
+    with span("validation"):
+        data = await decode_body(request, opp_input_adapter)
+    result = await predict_gate.run(predict_gate.deadline(request), run_prediction, dict(data))
+    return encode_response(request, result)
+
+@app.post("/predict/batch", openapi_extra=request_body_openapi({
+    "oneOf": [
+        {"type": "array", "items": OppInput.model_json_schema()},
+        OppColumns.model_json_schema(),
+    ]
+}))
+async def get_batch_prediction(request: Request):
+    """
+    Score many opportunities in one call. Accepts a list of rows or a
+    columnar object (one list per field) as JSON or msgpack.
+    """
+    with span("validation"):
+        data = await decode_body(request, opp_batch_adapter)
+    rows = data.to_rows() if isinstance(data, OppColumns) else [dict(row) for row in data]
+    deadline = batch_gate.deadline(request)
+    results = await batch_gate.run(deadline, run_batch_prediction, rows, deadline)
+    return encode_response(request, {"predictions": results})
 
 # --- Cross-chain arbitrage endpoint ---
 class ArbitrageInput(BaseModel):
@@ -66,125 +152,271 @@ class ArbitrageInput(BaseModel):
     chain_b: str
 
 @app.post("/arbitrage_opportunity")
-def arbitrage_opportunity(data: ArbitrageInput):
+async def arbitrage_opportunity(data: ArbitrageInput, request: Request):
     """
     Returns arbitrage opportunity details for a token between two chains.
     Fetches chain-specific DEX prices from MongoDB database.
     """
+    deadline = arbitrage_gate.deadline(request)
+    return await arbitrage_gate.run(deadline, compute_arbitrage, data, deadline)
+
+def pick_price(token_doc) -> Optional[float]:
+    """Prefer dexPrice over currentPrice for arbitrage; None if neither is set."""
+    if not token_doc:
+        return None
+    dex_price = token_doc.get('dexPrice')
+    if dex_price and dex_price > 0:
+        return dex_price
+    # Fallback to currentPrice if dexPrice not available
+    current_price = token_doc.get('currentPrice')
+    if current_price and current_price > 0:
+        return current_price
+    return None
+
+# Fetch gas price (gwei) for a chain
+def fetch_gas_price(chain, timeout=5.0, deadline: Optional[Deadline] = None):
+    # With a deadline the HTTP timeout shrinks to the time left; a timeout
+    # caused by that must not be papered over with the mock gas price
+    limit = deadline.timeout(timeout) if deadline is not None else timeout
+    try:
+        if chain == "ethereum":
+            headers = {}
+            api_key = os.getenv("BLOCKNATIVE_API_KEY")
+            if api_key:
+                headers["Authorization"] = api_key
+            url = "https://api.blocknative.com/gasprices/blockprices?chainid=1"
+            resp = requests.get(url, headers=headers, timeout=limit)
+            resp.raise_for_status()
+            data = resp.json()
+            prices = data.get("blockPrices", [{}])[0].get("estimatedPrices", [])
+            if prices:
+                for p in prices:
+                    if p.get("confidence") == 70:
+                        return float(p["maxFeePerGas"])
+                return float(prices[0]["maxFeePerGas"])
+            raise Exception(f"No gas price found in Blocknative response: {data}")
+        elif chain == "polygon":
+            url = "https://gasstation.polygon.technology/v2"
+            resp = requests.get(url, timeout=limit)
+            resp.raise_for_status()
+            data = resp.json()
+            return float(data["standard"]["maxFee"])
+        elif chain in ["bsc", "binance smart chain"]:
+            url = "https://bscgas.info/gas"
+            resp = requests.get(url, timeout=limit)
+            resp.raise_for_status()
+            data = resp.json()
+            return float(data["standard"])
+        else:
+            raise HTTPException(status_code=400, detail=f"Chain {chain} not supported.")
+    except Exception as e:
+        if deadline is not None and (
+            deadline.remaining() <= 0
+            or (isinstance(e, requests.exceptions.Timeout) and limit < timeout)
+        ):
+            raise DeadlineExceeded(f"Deadline exceeded during gas price fetch for {chain}")
+        return 20.0  # fallback mock value in gwei
+
+# Estimate gas cost in USD using native token prices
+def estimate_gas_cost(chain, gas_price_gwei, token_price):
+    # For accurate gas costs, we need the native token price (ETH, BNB, MATIC)
+    # Using the traded token price is incorrect - we should fetch native token prices
+    # For now, use average native token prices as fallback
+    native_prices = {
+        'ethereum': 3900.0,  # ETH price
+        'polygon': 0.80,     # MATIC price
+        'bsc': 600.0         # BNB price
+    }
+    native_price = native_prices.get(chain, token_price)
+    return gas_price_gwei * 21000 * 1e-9 * native_price
+
+def arbitrage_result(token, chain_a, chain_b, price_a, price_b, gas_a, gas_b):
+    """Spread, gas costs and net profit for one token between two chains."""
+    cost_a = estimate_gas_cost(chain_a, gas_a, price_a)
+    cost_b = estimate_gas_cost(chain_b, gas_b, price_b)
+    total_gas_cost = cost_a + cost_b
+
+    # Calculate spread and net profit
+    spread = abs(price_a - price_b)
+    net_profit = spread - total_gas_cost
+    profitable = net_profit > 0
+
+    return {
+        "token": token,
+        "chain_a": chain_a,
+        "chain_b": chain_b,
+        "price_a": price_a,
+        "price_b": price_b,
+        "gas_a_gwei": gas_a,
+        "gas_b_gwei": gas_b,
+        "cost_a_usd": cost_a,
+        "cost_b_usd": cost_b,
+        "total_gas_cost_usd": total_gas_cost,
+        "spread_usd": spread,
+        "net_profit_usd": net_profit,
+        "profitable": profitable
+    }
+
+def compute_arbitrage(data: ArbitrageInput, deadline: Deadline):
+    """Blocking part of /arbitrage_opportunity; every upstream call is bounded by the deadline."""
     try:
         token = data.token.upper()  # Keep uppercase for MongoDB query
         chain_a = data.chain_a.lower()
         chain_b = data.chain_b.lower()
 
         # Fetch chain-specific DEX prices from MongoDB
-        def fetch_dex_price(token_symbol, chain):
+        def fetch_dex_price(token_symbol, chain, timeout=5.0):
+            deadline.check(f"DB lookup for {token_symbol} on {chain}")
+            limit = deadline.timeout(timeout)
             try:
                 client = get_mongo_client()
                 db = client.get_database()
                 tokens_collection = db['tokens']
                 
-                token_doc = tokens_collection.find_one({
-                    'symbol': token_symbol,
-                    'chain': chain
-                })
+                with span("db"), pymongo.timeout(limit):
+                    token_doc = tokens_collection.find_one({
+                        'symbol': token_symbol,
+                        'chain': chain
+                    })
                 
-                if token_doc:
-                    # Prefer dexPrice over currentPrice for arbitrage
-                    dex_price = token_doc.get('dexPrice')
-                    if dex_price and dex_price > 0:
-                        return dex_price
-                    
-                    # Fallback to currentPrice if dexPrice not available
-                    current_price = token_doc.get('currentPrice')
-                    if current_price and current_price > 0:
-                        return current_price
+                price = pick_price(token_doc)
+                if price is not None:
+                    return price
                 
                 raise HTTPException(
                     status_code=404, 
                     detail=f"No price found for {token_symbol} on {chain}. Price may not have been fetched yet."
                 )
             except Exception as e:
+                # Same rule as fetch_gas_price: a timeout the deadline shortened is a 504
+                if deadline.remaining() <= 0 or (
+                    isinstance(e, pymongo.errors.PyMongoError) and e.timeout and limit < timeout
+                ):
+                    raise DeadlineExceeded(f"Deadline exceeded during DB lookup for {token_symbol} on {chain}")
                 raise HTTPException(status_code=502, detail=f"Database error: {str(e)}")
 
         price_a = fetch_dex_price(token, chain_a)
         price_b = fetch_dex_price(token, chain_b)
 
-        # Fetch gas price (gwei) for each chain
-        def fetch_gas_price(chain):
-            try:
-                if chain == "ethereum":
-                    headers = {}
-                    api_key = os.getenv("BLOCKNATIVE_API_KEY")
-                    if api_key:
-                        headers["Authorization"] = api_key
-                    url = "https://api.blocknative.com/gasprices/blockprices?chainid=1"
-                    resp = requests.get(url, headers=headers, timeout=5)
-                    resp.raise_for_status()
-                    data = resp.json()
-                    prices = data.get("blockPrices", [{}])[0].get("estimatedPrices", [])
-                    if prices:
-                        for p in prices:
-                            if p.get("confidence") == 70:
-                                return float(p["maxFeePerGas"])
-                        return float(prices[0]["maxFeePerGas"])
-                    raise Exception(f"No gas price found in Blocknative response: {data}")
-                elif chain == "polygon":
-                    url = "https://gasstation.polygon.technology/v2"
-                    resp = requests.get(url, timeout=5)
-                    resp.raise_for_status()
-                    data = resp.json()
-                    return float(data["standard"]["maxFee"])
-                elif chain in ["bsc", "binance smart chain"]:
-                    url = "https://bscgas.info/gas"
-                    resp = requests.get(url, timeout=5)
-                    resp.raise_for_status()
-                    data = resp.json()
-                    return float(data["standard"])
-                else:
-                    raise HTTPException(status_code=400, detail=f"Chain {chain} not supported.")
-            except Exception as e:
-                return 20.0  # fallback mock value in gwei
-
-        gas_a = fetch_gas_price(chain_a)
-        gas_b = fetch_gas_price(chain_b)
-
-        # Estimate gas cost in USD using native token prices
-        def estimate_gas_cost(chain, gas_price_gwei, token_price):
-            # For accurate gas costs, we need the native token price (ETH, BNB, MATIC)
-            # Using the traded token price is incorrect - we should fetch native token prices
-            # For now, use average native token prices as fallback
-            native_prices = {
-                'ethereum': 3900.0,  # ETH price
-                'polygon': 0.80,     # MATIC price
-                'bsc': 600.0         # BNB price
-            }
-            native_price = native_prices.get(chain, token_price)
-            return gas_price_gwei * 21000 * 1e-9 * native_price
-
-        cost_a = estimate_gas_cost(chain_a, gas_a, price_a)
-        cost_b = estimate_gas_cost(chain_b, gas_b, price_b)
-        total_gas_cost = cost_a + cost_b
-
-        # Calculate spread and net profit
-        spread = abs(price_a - price_b)
-        net_profit = spread - total_gas_cost
-        profitable = net_profit > 0
-
-        # Debug prints for all calculated values
-        return {
-            "token": token,
-            "chain_a": chain_a,
-            "chain_b": chain_b,
-            "price_a": price_a,
-            "price_b": price_b,
-            "gas_a_gwei": gas_a,
-            "gas_b_gwei": gas_b,
-            "cost_a_usd": cost_a,
-            "cost_b_usd": cost_b,
-            "total_gas_cost_usd": total_gas_cost,
-            "spread_usd": spread,
-            "net_profit_usd": net_profit,
-            "profitable": profitable
-        }
+        deadline.check(f"gas price fetch for {chain_a}")
+        with span(f"upstream_http:{chain_a}"):
+            gas_a = fetch_gas_price(chain_a, deadline=deadline)
+        deadline.check(f"gas price fetch for {chain_b}")
+        with span(f"upstream_http:{chain_b}"):
+            gas_b = fetch_gas_price(chain_b, deadline=deadline)
+
+        return arbitrage_result(token, chain_a, chain_b, price_a, price_b, gas_a, gas_b)
+    except DeadlineExceeded:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
+
+# --- Streaming of scored opportunities ---
+def fetch_all_dex_prices():
+    """DEX prices for every supported token/chain pair in a single query."""
+    tokens_collection = get_mongo_client().get_database()['tokens']
+    with pymongo.timeout(5):
+        docs = list(tokens_collection.find(
+            {'symbol': {'$in': SUPPORTED_TOKENS}, 'chain': {'$in': SUPPORTED_CHAINS}},
+            {'symbol': 1, 'chain': 1, 'dexPrice': 1, 'currentPrice': 1},
+        ))
+    prices = {}
+    for doc in docs:
+        price = pick_price(doc)
+        if price is not None:
+            prices[(doc['symbol'], doc['chain'])] = price
+    return prices
+
+def score_opportunities(pairs):
+    """
+    arbitrage_result plus the model's score for each
+    (token, chain_a, chain_b, price_a, price_b, gas_a, gas_b), buying on the
+    cheaper chain. All pairs are scored with a single model call.
+    """
+    results = [arbitrage_result(*pair) for pair in pairs]
+    prediction_inputs = []
+    for result in results:
+        low = min(result["price_a"], result["price_b"])
+        prediction_inputs.append({
+            "token": result["token"],
+            "chain": result["chain_a"] if result["price_a"] <= result["price_b"] else result["chain_b"],
+            "price": result["spread_usd"],
+            "gas": result["total_gas_cost_usd"],
+            "price_per_token": result["spread_usd"],
+            "price_diff_percent": (result["spread_usd"] / low * 100) if low > 0 else 0.0,
+        })
+    for result, prediction in zip(results, predict_opportunities(prediction_inputs)):
+        result["score"] = prediction["score"]
+        result["roi"] = prediction["roi"]
+    return results
+
+opportunity_stream = OpportunityStream(
+    tokens=SUPPORTED_TOKENS,
+    chains=SUPPORTED_CHAINS,
+    price_source=fetch_all_dex_prices,
+    gas_source=fetch_gas_price,
+    evaluate=score_opportunities,
+    price_interval=float(os.getenv("STREAM_PRICE_POLL_S", "2")),
+    gas_interval=float(os.getenv("STREAM_GAS_POLL_S", "30")),
+    max_subscribers=int(os.getenv("STREAM_MAX_SUBSCRIBERS", "100")),
+    max_pending=int(os.getenv("STREAM_MAX_PENDING", "256")),
+)
+
+@app.get("/stream/opportunities")
+async def stream_opportunities(
+    token: List[str] = Query(default=[]),
+    chain: List[str] = Query(default=[]),
+    min_score: Optional[float] = None,
+    min_profit: Optional[float] = None,
+):
+    """
+    Server-sent events of scored opportunities. Sends the current matching
+    pairs first, then only pairs whose result changed ("opportunity") or
+    that stopped matching the filters ("removed").
+    """
+    subscriber = Subscriber(token, chain, min_score, min_profit, opportunity_stream.max_pending)
+    opportunity_stream.subscribe(subscriber)
+    return SubscriptionResponse(opportunity_stream, subscriber)
+
+# --- Admin: profiling and request tracing ---
+# Disabled unless ADMIN_TOKEN is set; callers must send it as X-Admin-Token
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+MAX_PROFILE_SECONDS = 60
+
+def require_admin(x_admin_token: Optional[str] = Header(default=None)):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token, ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+admin = APIRouter(prefix="/admin", dependencies=[Depends(require_admin)])
+
+@admin.post("/profile", response_class=PlainTextResponse)
+async def run_profile(
+    seconds: float = Query(default=10, gt=0, le=MAX_PROFILE_SECONDS),
+    interval_ms: float = Query(default=5, ge=1, le=1000),
+):
+    """
+    Sample all threads for `seconds` and return collapsed stacks, ready for
+    flamegraph.pl or speedscope.
+    """
+    if profiler.running:
+        raise HTTPException(status_code=409, detail="A profile is already running")
+    try:
+        stacks = await anyio.to_thread.run_sync(profiler.profile, seconds, interval_ms / 1000)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return PlainTextResponse(stacks)
+
+@admin.post("/tracing")
+async def set_tracing(enabled: bool):
+    """Turn per-request stage tracing on or off."""
+    tracer.enabled = enabled
+    return {"enabled": tracer.enabled, "buffered": len(tracer.traces)}
+
+@admin.get("/traces")
+async def slowest_traces(limit: int = Query(default=20, ge=1, le=500)):
+    """Slowest recent requests from the trace ring buffer, with their stage spans."""
+    return {"enabled": tracer.enabled, "traces": tracer.slowest(limit)}
+
+app.include_router(admin)
@@ -0,0 +1,285 @@
+# llm/streaming.py
+# Push-based streaming of scored opportunities: inputs are polled once for
+# all pairs, pairs are re-scored only when their inputs change, and only
+# changed opportunities are pushed to subscribers
+
+import asyncio
+import contextvars
+import time
+from itertools import combinations
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+import anyio
+import anyio.to_thread
+import orjson
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+
+KEEPALIVE_SECONDS = 15
+
+
+def pair_key(token: str, chain_a: str, chain_b: str) -> str:
+    return f"{token}:{chain_a}:{chain_b}"
+
+
+def _fingerprint(opp: dict) -> tuple:
+    # Changes below these resolutions are not worth a push
+    return (opp["profitable"], round(opp["net_profit_usd"], 2), round(opp.get("score", 0.0), 4))
+
+
+class Subscriber:
+    """
+    One stream consumer with its filters and a bounded send buffer.
+
+    Pending events are keyed by pair so a newer update replaces an unsent
+    older one; if the buffer is still full, the oldest event is dropped.
+    Publishing never waits on the consumer.
+    """
+
+    def __init__(
+        self,
+        tokens: Iterable[str],
+        chains: Iterable[str],
+        min_score: Optional[float],
+        min_profit: Optional[float],
+        max_pending: int,
+    ):
+        self.tokens = {t.upper() for t in tokens}
+        self.chains = {c.lower() for c in chains}
+        self.min_score = min_score
+        self.min_profit = min_profit
+        self.max_pending = max_pending
+        self.pending: Dict[str, Tuple[str, dict]] = {}
+        self.visible = set()  # pairs this subscriber currently holds as matching
+        self.dropped = 0
+        self._wakeup = asyncio.Event()
+
+    def matches(self, opp: dict) -> bool:
+        if self.tokens and opp["token"] not in self.tokens:
+            return False
+        if self.chains and opp["chain_a"] not in self.chains and opp["chain_b"] not in self.chains:
+            return False
+        if self.min_score is not None and opp.get("score", 0.0) < self.min_score:
+            return False
+        if self.min_profit is not None and opp["net_profit_usd"] < self.min_profit:
+            return False
+        return True
+
+    def offer(self, key: str, opp: dict):
+        """Queue an update, or a removal if the pair no longer passes the filters."""
+        if self.matches(opp):
+            self.visible.add(key)
+            self._push(key, ("opportunity", opp))
+        else:
+            self.remove(key, opp)
+
+    def remove(self, key: str, opp: dict):
+        """Queue a removal if this subscriber currently sees the pair."""
+        if key in self.visible:
+            self.visible.discard(key)
+            self._push(key, ("removed", {
+                "token": opp["token"], "chain_a": opp["chain_a"], "chain_b": opp["chain_b"],
+            }))
+
+    def _push(self, key: str, event: Tuple[str, dict]):
+        self.pending.pop(key, None)
+        if len(self.pending) >= self.max_pending:
+            self.pending.pop(next(iter(self.pending)))
+            self.dropped += 1
+        self.pending[key] = event
+        self._wakeup.set()
+
+    async def drain(self, timeout: float) -> List[Tuple[str, dict]]:
+        """Wait up to `timeout` for events and take everything pending."""
+        if not self.pending:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                return []
+        self._wakeup.clear()
+        events = list(self.pending.values())
+        self.pending.clear()
+        return events
+
+
+class OpportunityStream:
+    """
+    Evaluates every token/chain pair while anyone is subscribed.
+
+    DEX prices are polled every `price_interval` seconds with one query for
+    all pairs and gas quotes every `gas_interval`; a pair is re-scored only
+    when one of its inputs changed, and pushed only when the result changed.
+    All changed pairs of a tick are scored with one `evaluate` call; pairs
+    whose price disappeared are dropped and announced as removed.
+    """
+
+    def __init__(
+        self,
+        tokens: List[str],
+        chains: List[str],
+        price_source: Callable[[], Dict[Tuple[str, str], float]],
+        gas_source: Callable[[str], float],
+        evaluate: Callable[[List[tuple]], List[dict]],
+        price_interval: float,
+        gas_interval: float,
+        max_subscribers: int,
+        max_pending: int,
+    ):
+        self.tokens = tokens
+        self.chains = chains
+        self.price_source = price_source
+        self.gas_source = gas_source
+        self.evaluate = evaluate
+        self.price_interval = price_interval
+        self.gas_interval = gas_interval
+        self.max_subscribers = max_subscribers
+        self.max_pending = max_pending
+        self.subscribers = set()
+        self.prices: Dict[Tuple[str, str], float] = {}
+        self.gas: Dict[str, float] = {}
+        self.latest: Dict[str, dict] = {}
+        self._gas_fetched_at = 0.0
+        self._task = None
+
+    def subscribe(self, subscriber: Subscriber):
+        """
+        Check capacity and register in one step (no await in between), so
+        concurrent connects cannot overshoot max_subscribers.
+        """
+        if len(self.subscribers) >= self.max_subscribers:
+            raise HTTPException(
+                status_code=503,
+                detail="Too many stream subscribers, retry later",
+                headers={"Retry-After": str(KEEPALIVE_SECONDS)},
+            )
+        self.subscribers.add(subscriber)
+        self._ensure_running()
+
+    def unsubscribe(self, subscriber: Subscriber):
+        self.subscribers.discard(subscriber)
+
+    def _ensure_running(self):
+        if self._task is None or self._task.done():
+            # Fresh context so the evaluator never inherits the first
+            # subscriber's request state (e.g. its trace)
+            loop = asyncio.get_running_loop()
+            self._task = contextvars.Context().run(loop.create_task, self._run())
+
+    async def _run(self):
+        try:
+            while self.subscribers:
+                try:
+                    changed, removed = await anyio.to_thread.run_sync(self._tick)
+                except Exception as e:
+                    print(f"⚠️  Opportunity stream evaluation failed: {e}")
+                    changed, removed = [], []
+                for key, opp in changed:
+                    for subscriber in list(self.subscribers):
+                        subscriber.offer(key, opp)
+                for key, opp in removed:
+                    for subscriber in list(self.subscribers):
+                        subscriber.remove(key, opp)
+                await asyncio.sleep(self.price_interval)
+        finally:
+            # Nobody is listening: drop state so the next subscriber never
+            # receives a stale snapshot
+            self.prices, self.gas, self.latest = {}, {}, {}
+            self._gas_fetched_at = 0.0
+
+    def _tick(self) -> Tuple[List[Tuple[str, dict]], List[Tuple[str, dict]]]:
+        """
+        Poll inputs and re-score pairs whose inputs changed (worker thread).
+
+        Returns:
+            (changed, removed) lists of (pair key, opportunity)
+        """
+        prices = self.price_source()
+        # A price that vanished counts as changed so its pairs get dropped
+        changed_prices = {k for k, v in prices.items() if self.prices.get(k) != v}
+        changed_prices.update(k for k in self.prices if k not in prices)
+        self.prices = prices
+
+        changed_gas = set()
+        if time.monotonic() - self._gas_fetched_at >= self.gas_interval:
+            for chain in self.chains:
+                gwei = self.gas_source(chain)
+                if self.gas.get(chain) != gwei:
+                    changed_gas.add(chain)
+                self.gas[chain] = gwei
+            self._gas_fetched_at = time.monotonic()
+
+        if not changed_prices and not changed_gas:
+            return [], []
+
+        stale, removed = [], []
+        for token in self.tokens:
+            for chain_a, chain_b in combinations(self.chains, 2):
+                inputs = ((token, chain_a), (token, chain_b))
+                if not (changed_prices.intersection(inputs) or changed_gas.intersection((chain_a, chain_b))):
+                    continue
+                key = pair_key(token, chain_a, chain_b)
+                if any(k not in prices for k in inputs):
+                    if key in self.latest:
+                        removed.append((key, self.latest.pop(key)))
+                    continue
+                stale.append((key, (
+                    token, chain_a, chain_b,
+                    prices[inputs[0]], prices[inputs[1]],
+                    self.gas[chain_a], self.gas[chain_b],
+                )))
+
+        changed = []
+        if stale:
+            results = self.evaluate([pair for _, pair in stale])
+            for (key, _), opp in zip(stale, results):
+                previous = self.latest.get(key)
+                if previous is None or _fingerprint(previous) != _fingerprint(opp):
+                    self.latest[key] = opp
+                    changed.append((key, opp))
+        return changed, removed
+
+    async def sse(self, subscriber: Subscriber):
+        """
+        Server-sent events for a subscriber registered with subscribe():
+        a snapshot of matching pairs, then deltas.
+        """
+        try:
+            for key, opp in self.latest.copy().items():
+                subscriber.offer(key, opp)
+            while True:
+                events = await subscriber.drain(KEEPALIVE_SECONDS)
+                if not events:
+                    yield b": keepalive\n\n"
+                    continue
+                for name, data in events:
+                    yield b"event: " + name.encode() + b"\ndata: " + orjson.dumps(data) + b"\n\n"
+        finally:
+            self.unsubscribe(subscriber)
+
+    def stats(self) -> dict:
+        return {
+            "subscribers": len(self.subscribers),
+            "pairs": len(self.latest),
+            "dropped": sum(s.dropped for s in self.subscribers),
+        }
+
+
+class SubscriptionResponse(StreamingResponse):
+    """
+    SSE response for a registered subscriber. Unsubscribes when the response
+    ends, even if the client left before the event generator ever started.
+    """
+
+    def __init__(self, stream: OpportunityStream, subscriber: Subscriber):
+        super().__init__(
+            stream.sse(subscriber),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+        self.stream = stream
+        self.subscriber = subscriber
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self.stream.unsubscribe(self.subscriber)
@@ -76,6 +76,24 @@ def load_opportunities_from_mongodb():
     return df
 
 
+def build_features(df: pd.DataFrame):
+    """One-hot encode categorical columns and separate features from labels."""
+    df_encoded = pd.get_dummies(df, columns=["symbol", "chainFrom", "chainTo"])
+    
+    feature_cols = [c for c in df_encoded.columns if c != "profitable"]
+    X = df_encoded[feature_cols]
+    y = df_encoded["profitable"]
+    
+    return X, y, feature_cols
+
+
+def split_data(X: pd.DataFrame, y: pd.Series):
+    """Deterministic train/test split shared by training and compaction."""
+    return train_test_split(
+        X, y, test_size=0.2, random_state=42, stratify=y if len(y.unique()) > 1 else None
+    )
+
+
 def train_model(df: pd.DataFrame):
     """Train Random Forest model on real opportunity data."""
     
@@ -86,22 +104,13 @@ def train_model(df: pd.DataFrame):
     
     # Feature engineering
     print("\n🔧 Engineering features...")
-    
-    # One-hot encode categorical features
-    df_encoded = pd.get_dummies(df, columns=["symbol", "chainFrom", "chainTo"])
-    
-    # Separate features and labels
-    feature_cols = [c for c in df_encoded.columns if c != "profitable"]
-    X = df_encoded[feature_cols]
-    y = df_encoded["profitable"]
+    X, y, feature_cols = build_features(df)
     
     print(f"   Features: {len(feature_cols)}")
     print(f"   Samples: {len(X)}")
     
     # Split data
-    X_train, X_test, y_train, y_test = train_test_split(
-        X, y, test_size=0.2, random_state=42, stratify=y if len(y.unique()) > 1 else None
-    )
+    X_train, X_test, y_train, y_test = split_data(X, y)
     
     # Train model
     print("\n🤖 Training Random Forest model...")
@@ -170,6 +179,7 @@ if __name__ == "__main__":
     print("=" * 60)
     print("\nNext steps:")
     print("1. Update predict.py to use the trained model")
-    print("2. Start ML service: cd llm && uvicorn service:app --reload")
-    print("3. Re-run opportunity scanner to score opportunities")
+    print("2. (Optional) Build a compact model: python3 compact.py")
+    print("3. Start ML service: cd llm && uvicorn service:app --reload")
+    print("4. Re-run opportunity scanner to score opportunities")
 
@@ -0,0 +1,104 @@
+# llm/wire.py
+# Request/response encoding for the ML service: orjson for JSON, optional msgpack
+
+from typing import Any, Optional
+import orjson
+from fastapi import HTTPException, Request, Response
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter, ValidationError
+
+try:
+    import msgpack
+except ImportError:  # msgpack is optional; JSON keeps working without it
+    msgpack = None
+
+JSON_TYPE = "application/json"
+MSGPACK_TYPE = "application/msgpack"
+MSGPACK_TYPES = (MSGPACK_TYPE, "application/x-msgpack")
+
+
+class OrjsonResponse(JSONResponse):
+    """JSON response rendered with orjson (handles numpy scalars from the model)."""
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+
+
+def media_type(header: Optional[str]) -> str:
+    """Strip parameters (charset etc.) from a content-type header value."""
+    return (header or "").split(";")[0].strip().lower()
+
+
+def _msgpack_default(obj: Any):
+    # numpy scalars from the model expose .item()
+    if hasattr(obj, "item"):
+        return obj.item()
+    raise TypeError(f"Cannot serialize {type(obj).__name__} to msgpack")
+
+
+async def decode_body(request: Request, adapter: TypeAdapter):
+    """
+    Validate the request body with a compiled pydantic adapter.
+
+    JSON bodies are parsed and validated in one pass by pydantic-core;
+    msgpack bodies are unpacked first and then validated.
+    """
+    body = await request.body()
+    content_type = media_type(request.headers.get("content-type")) or JSON_TYPE
+
+    try:
+        if content_type in MSGPACK_TYPES:
+            if msgpack is None:
+                raise HTTPException(status_code=415, detail="msgpack support is not installed")
+            try:
+                payload = msgpack.unpackb(body, raw=False)
+            except Exception as e:
+                raise HTTPException(status_code=400, detail=f"Invalid msgpack body: {str(e)}")
+            return adapter.validate_python(payload)
+
+        if content_type == JSON_TYPE or content_type.endswith("+json"):
+            return adapter.validate_json(body)
+    except ValidationError as e:
+        # Keep FastAPI's usual ("body", ...) error locations
+        raise RequestValidationError([
+            {**error, "loc": ("body", *error["loc"])} for error in e.errors(include_url=False)
+        ])
+
+    raise HTTPException(status_code=415, detail=f"Unsupported content type: {content_type}")
+
+
+def wants_msgpack(request: Request) -> bool:
+    """
+    Pick msgpack when the client asks for it in Accept, or when it sent
+    msgpack and did not express a preference.
+    """
+    if msgpack is None:
+        return False
+
+    accept = [media_type(t) for t in request.headers.get("accept", "").split(",") if t.strip()]
+    for t in accept:
+        if t in MSGPACK_TYPES:
+            return True
+        if t == JSON_TYPE:
+            return False
+
+    return media_type(request.headers.get("content-type")) in MSGPACK_TYPES
+
+
+def encode_response(request: Request, payload: Any) -> Response:
+    """Encode a response payload in the format negotiated with the client."""
+    if wants_msgpack(request):
+        return Response(
+            content=msgpack.packb(payload, default=_msgpack_default, use_bin_type=True),
+            media_type=MSGPACK_TYPE,
+        )
+    return OrjsonResponse(payload)
+
+
+def request_body_openapi(schema: dict) -> dict:
+    """openapi_extra for endpoints that read the raw body, so /docs still shows it."""
+    content = {JSON_TYPE: {"schema": schema}}
+    if msgpack is not None:
+        content[MSGPACK_TYPE] = {"schema": schema}
+    return {"requestBody": {"required": True, "content": content}}
@@ -42,6 +42,16 @@ interface ArbitrageResponse {
   profitable: boolean;
 }
 
+const PREDICT_TIMEOUT_MS = 10000;
+const ARBITRAGE_TIMEOUT_MS = 15000;
+// Budget the ML service gets below our own timeout, so it gives up first
+// despite network and queueing time
+const DEADLINE_HEADROOM_MS = 1000;
+
+function deadlineHeader(timeoutMs: number): string {
+  return String(timeoutMs - DEADLINE_HEADROOM_MS);
+}
+
 export class MLService {
   private static instance: MLService;
   private readonly mlServiceUrl: string;
@@ -63,9 +73,11 @@ export class MLService {
         `${this.mlServiceUrl}/predict`,
         request,
         {
-          timeout: 10000,
+          timeout: PREDICT_TIMEOUT_MS,
           headers: {
-            'Content-Type': 'application/json'
+            'Content-Type': 'application/json',
+            // Lets the ML service abandon work we will no longer wait for
+            'X-Deadline-Ms': deadlineHeader(PREDICT_TIMEOUT_MS)
           }
         }
       );
@@ -86,9 +98,11 @@ export class MLService {
         `${this.mlServiceUrl}/arbitrage_opportunity`,
         request,
         {
-          timeout: 15000,
+          timeout: ARBITRAGE_TIMEOUT_MS,
           headers: {
-            'Content-Type': 'application/json'
+            'Content-Type': 'application/json',
+            // Lets the ML service abandon work we will no longer wait for
+            'X-Deadline-Ms': deadlineHeader(ARBITRAGE_TIMEOUT_MS)
           }
         }
       );